@@ -16,18 +16,31 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from functools import lru_cache
-from typing import Dict, Tuple, List, Any, Optional
+from typing import Dict, Tuple, List, Any, Optional, NamedTuple
 import random
+from bisect import bisect_right
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+import os
+import pickle
+import tempfile
 
 
 # Deck model
 
 # Blackjack uses a finite deck with repeated card values.
-# We represent a single deck as a tuple of counts:
+# We represent a single deck as counts of each value:
 #   (A,2,3,4,5,6,7,8,9,10-value)
 # where 10-value includes 10/J/Q/K (16 cards total).
 #
+# The counts are packed into a single Python int, 6 bits per value
+# (a single deck never holds more than 16 of one value), with the total
+# number of remaining cards kept in one more 6-bit field above them
+# (so a packed deck holds at most 63 cards: one deck, not a shoe). Decks are used
+# as memo keys in the EV recursion, and hashing one small int is
+# much cheaper than hashing a 10-tuple. Removing a card is a single
+# subtraction.
+#
 # This section provides:
 # - A standard "full single deck" count vector
 # - Helper functions to remove a drawn card from the deck counts
@@ -35,15 +48,51 @@ import random
 # - Random drawing from the remaining deck (draw_random)
 
 CARD_VALUES = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
-Deck = Tuple[int, ...]  
+Deck = int
+
+_COUNT_BITS = 6
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
+_TOTAL_SHIFT = _COUNT_BITS * len(CARD_VALUES)
+_COUNT_SHIFTS = tuple(_COUNT_BITS * i for i in range(len(CARD_VALUES)))
+
+
+def make_deck(counts: Tuple[int, ...]) -> Deck:
+    """Pack (A,2,...,9,10-value) counts into a Deck."""
+    if len(counts) != len(CARD_VALUES):
+        raise ValueError(f"Expected {len(CARD_VALUES)} counts, got {len(counts)}")
+    deck = 0
+    for i, c in enumerate(counts):
+        if not 0 <= c <= _COUNT_MASK:
+            raise ValueError(f"Invalid card count: {c}")
+        deck |= c << (_COUNT_BITS * i)
+    n = sum(counts)
+    # The total gets a single count-sized field; _state_key packs the
+    # rest of a cache key directly above it.
+    if n > _COUNT_MASK:
+        raise ValueError(f"Too many cards for a packed deck: {n} > {_COUNT_MASK}")
+    return deck | (n << _TOTAL_SHIFT)
+
+
+def deck_counts(deck: Deck) -> Tuple[int, ...]:
+    """Unpack a Deck into (A,2,...,9,10-value) counts."""
+    return tuple([(deck >> shift) & _COUNT_MASK for shift in _COUNT_SHIFTS])
 
 
 def full_single_deck_counts() -> Deck:
-    return (4, 4, 4, 4, 4, 4, 4, 4, 4, 16)
+    return make_deck((4, 4, 4, 4, 4, 4, 4, 4, 4, 16))
+
+
+# Every hand starts from this deck, so the first plies of every hand
+# share cache entries.
+FULL_DECK: Deck = full_single_deck_counts()
 
 
 def total_cards(deck: Deck) -> int:
-    return sum(deck)
+    return deck >> _TOTAL_SHIFT
+
+
+def count_of(deck: Deck, v: int) -> int:
+    return (deck >> (_COUNT_BITS * _idx_for_value(v))) & _COUNT_MASK
 
 
 def _idx_for_value(v: int) -> int:
@@ -56,13 +105,18 @@ def _idx_for_value(v: int) -> int:
     raise ValueError(f"Invalid card value: {v}")
 
 
+# Amount to subtract from a packed deck to remove one card of value v
+# (one from that value's count and one from the total).
+_DRAW_DELTA = {
+    v: (1 << (_COUNT_BITS * _idx_for_value(v))) | (1 << _TOTAL_SHIFT)
+    for v in CARD_VALUES
+}
+
+
 def dec_count(deck: Deck, v: int) -> Deck:
-    i = _idx_for_value(v)
-    if deck[i] <= 0:
+    if count_of(deck, v) <= 0:
         raise ValueError(f"No remaining card of value {v} in deck.")
-    lst = list(deck)
-    lst[i] -= 1
-    return tuple(lst)
+    return deck - _DRAW_DELTA[v]
 
 
 def iter_draws(deck: Deck):
@@ -70,29 +124,29 @@ def iter_draws(deck: Deck):
     n = total_cards(deck)
     if n == 0:
         return
-    for v in CARD_VALUES:
-        i = _idx_for_value(v)
-        c = deck[i]
+    for i, v in enumerate(CARD_VALUES):
+        c = (deck >> (_COUNT_BITS * i)) & _COUNT_MASK
         if c > 0:
             yield v, c / n
 
 
+# Cumulative counts per deck for draw_random, filled on first use.
+_CUM_COUNTS: Dict[Deck, Tuple[int, ...]] = {}
+
+
 def draw_random(deck: Deck) -> Tuple[int, Deck]:
-    
+    # Bisect the deck's cumulative counts instead of scanning the
+    # buckets. The same randrange(n) draw maps to the same card as a
+    # linear scan, so seeded runs are unchanged.
     n = total_cards(deck)
     if n <= 0:
         raise ValueError("Cannot draw from empty deck.")
-    r = random.randrange(n)
-    acc = 0
-    for v in CARD_VALUES:
-        i = _idx_for_value(v)
-        c = deck[i]
-        if c <= 0:
-            continue
-        if acc + c > r:
-            return v, dec_count(deck, v)
-        acc += c
-    raise RuntimeError("Deck inconsistent.")
+    cum = _CUM_COUNTS.get(deck)
+    if cum is None:
+        cum = tuple(accumulate(deck_counts(deck)))
+        _CUM_COUNTS[deck] = cum
+    v = CARD_VALUES[bisect_right(cum, random.randrange(n))]
+    return v, deck - _DRAW_DELTA[v]
 
 
 
@@ -110,6 +164,53 @@ def draw_random(deck: Deck) -> Tuple[int, Deck]:
 # - adds a card value to the hand
 # - treats aces as 11 when safe, else 1
 # - automatically converts aces from 11 -> 1 as needed to prevent bust
+#
+# add_card(...) is the same update on plain ints; the EV and dealer
+# recursions use it directly so they never allocate Hand objects.
+#
+# Every reachable (usable_aces, total, card) combination is precomputed
+# into the _ADD table at import time, so in the hot paths a card update
+# is one lookup, _ADD[ua][t][v] -> (new_total, new_usable_aces), with no
+# branches or ace-downgrade loop.
+
+def _add_card_slow(total: int, usable_aces: int, card_value: int) -> Tuple[int, int]:
+    t = total
+    ua = usable_aces
+
+    if card_value == 1:  # Ace
+        if t + 11 <= 21:
+            t += 11
+            ua += 1
+        else:
+            t += 1
+    else:
+        t += card_value
+
+    while t > 21 and ua > 0:
+        t -= 10
+        ua -= 1
+
+    return t, ua
+
+
+_ADD_ACES = 5    # usable aces 0..4
+_ADD_TOTALS = 32  # totals 0..31 (21 + a ten)
+
+# Index 0 of the card axis is unused so card values index directly.
+_ADD: Tuple[Tuple[Tuple[Tuple[int, int], ...], ...], ...] = tuple(
+    tuple(
+        ((t, ua),) + tuple(_add_card_slow(t, ua, v) for v in CARD_VALUES)
+        for t in range(_ADD_TOTALS)
+    )
+    for ua in range(_ADD_ACES)
+)
+
+
+def add_card(total: int, usable_aces: int, card_value: int) -> Tuple[int, int]:
+    if total < _ADD_TOTALS and usable_aces < _ADD_ACES and 1 <= card_value <= 10:
+        return _ADD[usable_aces][total][card_value]
+    return _add_card_slow(total, usable_aces, card_value)
+
 
 @dataclass(frozen=True)
 class Hand:
@@ -121,22 +222,7 @@ class Hand:
         return Hand(total=0, usable_aces=0)
 
     def add(self, card_value: int) -> "Hand":
-        t = self.total
-        ua = self.usable_aces
-
-        if card_value == 1:  # Ace
-            if t + 11 <= 21:
-                t += 11
-                ua += 1
-            else:
-                t += 1
-        else:
-            t += card_value
-
-        while t > 21 and ua > 0:
-            t -= 10
-            ua -= 1
-
+        t, ua = add_card(self.total, self.usable_aces, card_value)
         return Hand(total=t, usable_aces=ua)
 
     @property
@@ -149,8 +235,9 @@ class Hand:
 
 
 
-@dataclass
-class Step:
+# One trace event. A NamedTuple (immutable, no per-instance __dict__)
+# since a traced hand emits around ten of them.
+class Step(NamedTuple):
     actor: str          # "SYSTEM" / "PLAYER" / "DEALER"
     action: str         # "DEAL" / "HIT" / "STAND" / "DRAW"
     card: Optional[int] 
@@ -182,7 +269,7 @@ class Tracer:
 # end up with (17-21 or bust) given the dealer upcard and remaining deck.
 #
 # We compute an exact probability distribution for the dealer's final
-# result using recursion over possible dealer draws.
+# result by dynamic programming over possible dealer draws.
 #
 # Dealer policy implemented:
 # - Hit while total < 17
@@ -190,77 +277,157 @@ class Tracer:
 # - Hard 17: Stand
 # - Soft 17: Hit with 50% probability, Stand with 50% probability
 #
-# dealer_final_dist(...) returns a distribution over outcomes:
-#   {17: p17, 18: p18, ..., 21: p21, "bust": pbust}
+# dealer_final_dist(...) returns a distribution over outcomes as a
+# fixed-size vector in DEALER_OUTCOMES order:
+#   (p17, p18, p19, p20, p21, pbust)
+# so merging sub-distributions is an indexed add rather than dict
+# lookups keyed by outcome.
 #
-# We memoize dealer_final_dist with lru_cache to avoid recomputing the
-# same states, since EV calculations call it many times.
+# The computations below work on plain ints only (hand total, usable
+# aces, upcard, packed deck) and memoize into module-level dicts keyed
+# by a single packed int, see _state_key. The public functions look up
+# the cache and, on a miss, fill it bottom-up with _fill_bottom_up
+# rather than recursing.
 
 OutcomeKey = object
-OutcomeDist = Dict[OutcomeKey, float]
+OutcomeDist = Tuple[float, ...]
 
+# Probability the dealer hits a soft 17 (stands otherwise).
+DEALER_SOFT17_HIT_PROB = 0.5
 
-def _merge_dist(dst: OutcomeDist, src: OutcomeDist, weight: float) -> None:
-    for k, p in src.items():
-        dst[k] = dst.get(k, 0.0) + weight * p
+DEALER_OUTCOMES: Tuple[OutcomeKey, ...] = (17, 18, 19, 20, 21, "bust")
+OUTCOME_IDX: Dict[OutcomeKey, int] = {k: i for i, k in enumerate(DEALER_OUTCOMES)}
 
+# Distribution putting all mass on one outcome, for the standing cases.
+_CERTAIN: Dict[OutcomeKey, OutcomeDist] = {
+    k: tuple(1.0 if j == i else 0.0 for j in range(len(DEALER_OUTCOMES)))
+    for i, k in enumerate(DEALER_OUTCOMES)
+}
 
-@lru_cache(maxsize=None)
-def dealer_final_dist(hand_total: int, usable_aces: int, deck: Deck) -> Tuple[Tuple[OutcomeKey, float], ...]:
+# Bits above the packed deck (counts + total) used for the rest of a key.
+_KEY_SHIFT = _TOTAL_SHIFT + _COUNT_BITS
 
-    # Dealer Rules: Hit below 17, stand above 17, hard 17 stand, SOFT 17 hit with 50% probability.
+_DEALER_CACHE: Dict[int, OutcomeDist] = {}
+_STAND_CACHE: Dict[int, Tuple[float, ...]] = {}
+_EV_CACHE: Dict[int, float] = {}
 
-    hand = Hand(hand_total, usable_aces)
 
-    if hand.total > 21:
-        return (("bust", 1.0),)
+def _state_key(hand_total: int, usable_aces: int, deck: Deck, upcard: int = 0) -> int:
+    # total <= 31 (5 bits), usable aces <= 4 (3 bits), upcard <= 10 (4 bits)
+    return deck | (hand_total << _KEY_SHIFT) | (usable_aces << (_KEY_SHIFT + 5)) | (upcard << (_KEY_SHIFT + 8))
 
-    if hand.total > 17:
-        return ((hand.total, 1.0),)
 
-    if hand.total == 17 and not hand.is_soft:
-        return ((17, 1.0),)
+def clear_caches() -> None:
+    _CUM_COUNTS.clear()
+    _DEALER_CACHE.clear()
+    _STAND_CACHE.clear()
+    _EV_CACHE.clear()
 
-    dist: OutcomeDist = {}
 
-    if hand.total == 17 and hand.is_soft:
-        dist[17] = dist.get(17, 0.0) + 0.5
-        hit_weight = 0.5
-    else:
-        hit_weight = 1.0
+def _merge_dist(dst: List[float], src: OutcomeDist, weight: float) -> None:
+    for i, p in enumerate(src):
+        dst[i] += weight * p
 
-    if hit_weight > 0.0:
-        for v, p in iter_draws(deck):
-            deck2 = dec_count(deck, v)
-            new_hand = hand.add(v)
-            sub = dict(dealer_final_dist(new_hand.total, new_hand.usable_aces, deck2))
-            _merge_dist(dist, sub, hit_weight * p)
 
-    s = sum(dist.values())
+def _normalized(dist: List[float]) -> OutcomeDist:
+    s = sum(dist)
     if s > 0:
-        for k in list(dist.keys()):
-            dist[k] /= s
+        return tuple(p / s for p in dist)
+    return tuple(dist)
+
+
+def _fill_bottom_up(cache: Dict[int, Any], key: int, state: Tuple[int, ...], children, compute) -> None:
+    # Iterative DP instead of recursion. Every child state has one card
+    # fewer in the deck than its parent, so grouping the uncached states
+    # reachable from `state` into layers by cards drawn gives a
+    # topological order. Layers are then filled from the deepest one
+    # back to the root, so compute(...) only ever reads children that
+    # are already cached (or settled). No Python frames are stacked, so
+    # the recursion limit never comes into play however deep a hand is.
+    layers = []
+    frontier = {key: state}
+    while frontier:
+        layers.append(frontier)
+        nxt: Dict[int, Tuple[int, ...]] = {}
+        for st in frontier.values():
+            for child_key, child in children(*st):
+                if child_key not in cache:
+                    nxt[child_key] = child
+        frontier = nxt
+    for layer in reversed(layers):
+        for k, st in layer.items():
+            cache[k] = compute(*st)
+
+
+def _dealer_settled(t: int, ua: int) -> Optional[OutcomeDist]:
+    # Dealer Rules: Hit below 17, stand above 17, hard 17 stand, SOFT 17 hit with 50% probability.
+    if t > 21:
+        return _CERTAIN["bust"]
+    if t > 17:
+        return _CERTAIN[t]
+    if t == 17 and ua == 0:
+        return _CERTAIN[17]
+    return None
+
+
+def _dealer_children(t: int, ua: int, deck: Deck) -> List[Tuple[int, Tuple[int, ...]]]:
+    # Child hands the dealer still draws from (the inverse of
+    # _dealer_settled, inlined since this runs for every state).
+    out = []
+    for i, v in enumerate(CARD_VALUES):
+        if (deck >> _COUNT_SHIFTS[i]) & _COUNT_MASK:
+            nt, nua = _ADD[ua][t][v]
+            if nt < 17 or (nt == 17 and nua > 0):
+                deck2 = deck - _DRAW_DELTA[v]
+                out.append((_state_key(nt, nua, deck2), (nt, nua, deck2)))
+    return out
+
+
+def dealer_final_dist(hand_total: int, usable_aces: int, deck: Deck) -> OutcomeDist:
+    settled = _dealer_settled(hand_total, usable_aces)
+    if settled is not None:
+        return settled
+    key = _state_key(hand_total, usable_aces, deck)
+    dist = _DEALER_CACHE.get(key)
+    if dist is None:
+        _fill_bottom_up(_DEALER_CACHE, key, (hand_total, usable_aces, deck), _dealer_children, _dealer_final_dist)
+        dist = _DEALER_CACHE[key]
+    return dist
 
-    return tuple(sorted(dist.items(), key=lambda x: str(x[0])))
+
+def _dealer_final_dist(t: int, ua: int, deck: Deck) -> OutcomeDist:
+    # One DP step for an unsettled dealer hand (total < 17 or soft 17);
+    # every child is already cached or settled.
+    dist = [0.0] * len(DEALER_OUTCOMES)
+
+    if t == 17:  # soft 17
+        dist[OUTCOME_IDX[17]] += 1.0 - DEALER_SOFT17_HIT_PROB
+        hit_weight = DEALER_SOFT17_HIT_PROB
+    else:
+        hit_weight = 1.0
+
+    for v, p in iter_draws(deck):
+        nt, nua = _ADD[ua][t][v]
+        _merge_dist(dist, dealer_final_dist(nt, nua, deck - _DRAW_DELTA[v]), hit_weight * p)
+
+    return _normalized(dist)
 
 
 def dealer_dist_from_upcard(upcard_value: int, deck_after_upcard: Deck) -> OutcomeDist:
-    base = Hand.empty().add(upcard_value)
-    dist: OutcomeDist = {}
+    # Same vector layout as dealer_final_dist. Not cached itself: the EV
+    # computation reads the cached stand-EV row built from it (see
+    # _stand_row).
+    bt, bua = add_card(0, 0, upcard_value)
+    dist = [0.0] * len(DEALER_OUTCOMES)
 
     for hole, p_hole in iter_draws(deck_after_upcard):
-        deck2 = dec_count(deck_after_upcard, hole)
-        start = base.add(hole)
-        sub = dict(dealer_final_dist(start.total, start.usable_aces, deck2))
-        _merge_dist(dist, sub, p_hole)
-
-    s = sum(dist.values())
-    for k in list(dist.keys()):
-        dist[k] /= s
-    return dist
+        t, ua = _ADD[bua][bt][hole]
+        _merge_dist(dist, dealer_final_dist(t, ua, deck_after_upcard - _DRAW_DELTA[hole]), p_hole)
+
+    return _normalized(dist)
 
 
-# Player EV (Hit vs Stand) with recursion + memoization
+# Player EV (Hit vs Stand) with dynamic programming + memoization
 
 # This is the core AI logic.
 #
@@ -280,46 +447,194 @@ def dealer_dist_from_upcard(upcard_value: int, deck_after_upcard: Deck) -> Outco
 #   max(EV(hit), EV(stand))
 # from a given game state.
 #
-# This recursion is like an "expectation" decision tree:
+# This is like an "expectation" decision tree:
 # - chance nodes = random draws
 # - decision nodes = hit or stand
 #
-# We memoize ev_optimal to make the runtime practical.
+# We memoize ev_optimal to make the runtime practical, and evaluate the
+# tree bottom-up (deepest decks first) instead of recursing.
+
+def _payoff_vs_outcome(player_total: int, outcome: OutcomeKey) -> float:
+    if outcome == "bust":
+        return 1.0
+    dealer_total = int(outcome)
+    if player_total > dealer_total:
+        return 1.0
+    if player_total < dealer_total:
+        return -1.0
+    return 0.0
+
+
+# payoff_vs_dealer[player_total][k] is the player's payoff when standing
+# on player_total against DEALER_OUTCOMES[k], so ev_stand is a dot
+# product with the dealer distribution.
+payoff_vs_dealer: Tuple[Tuple[float, ...], ...] = tuple(
+    tuple(_payoff_vs_outcome(t, outcome) for outcome in DEALER_OUTCOMES)
+    for t in range(32)
+)
+
 
 def ev_stand(player_hand: Hand, dealer_upcard: int, deck: Deck) -> float:
-    d = dealer_dist_from_upcard(dealer_upcard, deck)
-    ev = 0.0
-    for outcome, p in d.items():
-        if outcome == "bust":
-            ev += p * 1.0
-        else:
-            dealer_total = int(outcome)
-            if player_hand.total > dealer_total:
-                ev += p * 1.0
-            elif player_hand.total < dealer_total:
-                ev += p * -1.0
-            else:
-                ev += 0.0
-    return ev
+    return _ev_stand(player_hand.total, dealer_upcard, deck)
+
+
+def ev_hit(player_hand: Hand, dealer_upcard: int, deck: Deck) -> float:
+    return _ev_hit(player_hand.total, player_hand.usable_aces, dealer_upcard, deck)
+
+
+def _ev_children(t: int, ua: int, dealer_upcard: int, deck: Deck) -> List[Tuple[int, Tuple[int, ...]]]:
+    out = []
+    for i, v in enumerate(CARD_VALUES):
+        if (deck >> _COUNT_SHIFTS[i]) & _COUNT_MASK:
+            nt, nua = _ADD[ua][t][v]
+            if nt <= 21:
+                deck2 = deck - _DRAW_DELTA[v]
+                out.append((_state_key(nt, nua, deck2, dealer_upcard), (nt, nua, dealer_upcard, deck2)))
+    return out
 
 
-@lru_cache(maxsize=None)
 def ev_optimal(player_total: int, player_usable_aces: int, dealer_upcard: int, deck: Deck) -> float:
-    hand = Hand(player_total, player_usable_aces)
-    if hand.total > 21:
+    if player_total > 21:
         return -1.0
-    s = ev_stand(hand, dealer_upcard, deck)
-    h = ev_hit(hand, dealer_upcard, deck)
+    key = _state_key(player_total, player_usable_aces, deck, dealer_upcard)
+    ev = _EV_CACHE.get(key)
+    if ev is None:
+        _fill_bottom_up(
+            _EV_CACHE, key, (player_total, player_usable_aces, dealer_upcard, deck), _ev_children, _ev_optimal
+        )
+        ev = _EV_CACHE[key]
+    return ev
+
+
+def _ev_optimal(t: int, ua: int, dealer_upcard: int, deck: Deck) -> float:
+    # One DP step; every non-bust child is already cached.
+    s = _ev_stand(t, dealer_upcard, deck)
+    h = _ev_hit(t, ua, dealer_upcard, deck)
     return max(s, h)
 
 
-def ev_hit(player_hand: Hand, dealer_upcard: int, deck: Deck) -> float:
-    ev = 0.0
-    for v, p in iter_draws(deck):
-        deck2 = dec_count(deck, v)
-        new_hand = player_hand.add(v)
-        ev += p * ev_optimal(new_hand.total, new_hand.usable_aces, dealer_upcard, deck2)
-    return ev
+def _stand_row(dealer_upcard: int, deck: Deck) -> Tuple[float, ...]:
+    # EV of standing for every player total against one (upcard, deck)
+    # state, computed from a single dealer distribution and cached as one
+    # row, so every total the recursion stands on at this deck is a
+    # lookup into the same entry.
+    key = _state_key(0, 0, deck, dealer_upcard)
+    row = _STAND_CACHE.get(key)
+    if row is None:
+        probs = dealer_dist_from_upcard(dealer_upcard, deck)
+        row = tuple(sum(w * p for w, p in zip(payoffs, probs)) for payoffs in payoff_vs_dealer)
+        _STAND_CACHE[key] = row
+    return row
+
+
+def _ev_stand(t: int, dealer_upcard: int, deck: Deck) -> float:
+    return _stand_row(dealer_upcard, deck)[t]
+
+
+def _ev_hit(t: int, ua: int, dealer_upcard: int, deck: Deck) -> float:
+    # Dot product of the remaining counts with the child EVs, divided by
+    # the card total once, rather than a probability per draw.
+    n = total_cards(deck)
+    if n == 0:
+        return 0.0
+    counts = deck_counts(deck)
+    child = [0.0] * len(CARD_VALUES)
+    for i, v in enumerate(CARD_VALUES):
+        if counts[i] > 0:
+            nt, nua = _ADD[ua][t][v]
+            child[i] = ev_optimal(nt, nua, dealer_upcard, deck - _DRAW_DELTA[v])
+    return sum(c * e for c, e in zip(counts, child)) / n
+
+
+# The tables warm_caches fills (EV per player state and stand-EV row per
+# (upcard, deck)) only depend on the rules and FULL_DECK, so they are
+# precomputed once and written next to this module. Later processes
+# load them instead of recomputing, and EVAgent.choose does no EV work
+# at all. Each file starts with a header recording the key layout
+# version and every rule the tables were computed under; a file whose
+# header does not match the current module is ignored and rebuilt.
+# Bump _TABLES_FORMAT whenever the key layout or table contents change.
+
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ev_tables.pkl")
+_TABLES_FORMAT = 2
+
+
+def _tables_header() -> Tuple[Any, ...]:
+    return (_TABLES_FORMAT, FULL_DECK, DEALER_OUTCOMES, DEALER_SOFT17_HIT_PROB, payoff_vs_dealer)
+
+
+def save_tables(path: str = TABLES_PATH) -> None:
+    # Write to a temp file unique to this process, then rename it into
+    # place, so processes warming up at the same time never share a temp
+    # file and readers only ever see a complete table file.
+    directory, name = os.path.split(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("wb", dir=directory, prefix=name + ".", suffix=".tmp", delete=False) as f:
+        tmp = f.name
+        try:
+            pickle.dump((_tables_header(), _EV_CACHE, _STAND_CACHE), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            f.close()
+            os.unlink(tmp)
+            raise
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def load_tables(path: str = TABLES_PATH) -> bool:
+    """Load precomputed tables into the caches. False if missing, unreadable or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except Exception:
+        return False
+    if not (isinstance(data, tuple) and len(data) == 3):
+        return False
+    header, ev, stand = data
+    if header != _tables_header() or not isinstance(ev, dict) or not isinstance(stand, dict):
+        return False
+    _EV_CACHE.update(ev)
+    _STAND_CACHE.update(stand)
+    return True
+
+
+def warm_caches(path: Optional[str] = TABLES_PATH) -> None:
+    """
+    Precompute ev_optimal for every first decision of a hand: each
+    (player card 1, upcard, player card 2, hole) deal from FULL_DECK,
+    with the deck the agent actually sees after the hole card is drawn.
+    Afterwards EVAgent.choose is served from the caches for every state
+    reachable in a hand. Player card order does not change the state, so
+    each pair is evaluated once.
+
+    With a `path`, the tables are loaded from it when present and saved
+    to it after computing them, so only the first run pays for the
+    computation. path=None always computes in memory.
+    """
+    if path is not None and load_tables(path):
+        return
+
+    for p1 in CARD_VALUES:
+        deck1 = dec_count(FULL_DECK, p1)
+        for up, _ in iter_draws(deck1):
+            deck2 = deck1 - _DRAW_DELTA[up]
+            for p2, _ in iter_draws(deck2):
+                if p2 < p1:
+                    continue
+                deck3 = deck2 - _DRAW_DELTA[p2]
+                t, ua = add_card(*add_card(0, 0, p1), p2)
+                for hole, _ in iter_draws(deck3):
+                    ev_optimal(t, ua, up, deck3 - _DRAW_DELTA[hole])
+
+    if path is not None:
+        try:
+            save_tables(path)
+        except OSError:
+            # e.g. a read-only install directory; the tables are still
+            # in memory for this process, just not persisted
+            pass
 
 
 # Individual Agents
@@ -352,9 +667,11 @@ class NaiveAgent:
 
     def __init__(self, hit_below: int = 16):
         self.hit_below = hit_below
+        # Action for every possible player total (0..31)
+        self._actions = tuple("HIT" if t <= hit_below else "STAND" for t in range(32))
 
     def choose(self, player_hand: Hand, dealer_upcard: int, deck: Deck) -> str:
-        return "HIT" if player_hand.total <= self.hit_below else "STAND"
+        return self._actions[player_hand.total]
 
 
 # This section simulates real blackjack hands using the deck counts.
@@ -379,19 +696,29 @@ class NaiveAgent:
 # (no tracing, for performance evaluation).
 
 
-def resolve(player_hand: Hand, dealer_hand: Hand) -> int:
-    """+1 win, -1 loss, 0 push"""
-    if player_hand.total > 21:
+def _resolve_totals(player_total: int, dealer_total: int) -> int:
+    if player_total > 21:
         return -1
-    if dealer_hand.total > 21:
+    if dealer_total > 21:
         return 1
-    if player_hand.total > dealer_hand.total:
+    if player_total > dealer_total:
         return 1
-    if player_hand.total < dealer_hand.total:
+    if player_total < dealer_total:
         return -1
     return 0
 
 
+# _PAYOFF[player_total][dealer_total] for every total a hand can reach.
+_PAYOFF: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(_resolve_totals(p, d) for d in range(33)) for p in range(33)
+)
+
+
+def resolve(player_hand: Hand, dealer_hand: Hand) -> int:
+    """+1 win, -1 loss, 0 push"""
+    return _PAYOFF[player_hand.total][dealer_hand.total]
+
+
 def deal_initial_with_trace(deck: Deck, tracer: Tracer, reveal_hole: bool = True) -> Tuple[Hand, Hand, int, Deck]:
     p = Hand.empty()
     d = Hand.empty()
@@ -447,11 +774,12 @@ def dealer_play_sim(
             return dealer_hand, deck
 
         # soft 17: 50% to hit for an element of randomness
-        if random.random() < 0.5:
+        if random.random() < DEALER_SOFT17_HIT_PROB:
             c, deck = draw_random(deck)
             dealer_hand = dealer_hand.add(c)
             if tracer:
-                tracer.emit("DEALER", "DRAW", c, player_total_for_ui, dealer_hand.total, "soft 17 hit (50%)")
+                tracer.emit("DEALER", "DRAW", c, player_total_for_ui, dealer_hand.total,
+                            f"soft 17 hit ({DEALER_SOFT17_HIT_PROB:.0%})")
         else:
             return dealer_hand, deck
 
@@ -460,7 +788,7 @@ def play_hand_with_trace(agent, seed: Optional[int] = None, reveal_hole: bool =
     if seed is not None:
         random.seed(seed)
 
-    deck = full_single_deck_counts()
+    deck = FULL_DECK
     tracer = Tracer()
 
     p_hand, d_hand, upcard, deck = deal_initial_with_trace(deck, tracer, reveal_hole=reveal_hole)
@@ -503,7 +831,7 @@ def play_hand_with_trace(agent, seed: Optional[int] = None, reveal_hole: bool =
 
 
 def play_one_hand(agent) -> int:
-    deck = full_single_deck_counts()
+    deck = FULL_DECK
     p_hand, d_hand, upcard, deck = deal_initial_no_trace(deck)
 
     while not p_hand.is_bust:
@@ -519,43 +847,187 @@ def play_one_hand(agent) -> int:
     d_final, deck = dealer_play_sim(d_hand, deck, tracer=None, player_total_for_ui=-1)
     return resolve(p_hand, d_final)
 
-# run_match runs many independent simulated hands for each agent and
-# collects:
-# - wins, losses, pushes
+# run_match evaluates each agent exactly instead of simulating hands.
+#
+# Every 4-card initial deal (player card 1, dealer upcard, player card 2,
+# dealer hole) is enumerated and weighted by its probability under the
+# full single deck. From each deal the agent's policy is followed through
+# every possible player draw, and when it stands the dealer's exact final
+# distribution (dealer_final_dist) gives the win/loss/push probabilities.
+# This assumes the agent is deterministic given (hand, upcard, deck),
+# which holds for both agents below.
+#
+# The result reports, per agent:
+# - win/loss/push probabilities (win_rate, loss_rate, push_rate)
+# - the expected wins, losses, pushes over `hands` hands (rounded)
 # - average return per hand (mean payoff)
 #
 # Average return is a key objective metric:
-#   avg_return = (wins - losses) / hands
+#   avg_return = P(win) - P(loss)
+#
+# Monte-Carlo noise is gone, so the reported numbers no longer depend on
+# `seed`; the argument is kept for API compatibility.
 #
-# A fixed seed can be used for reproducible experiments.
-# Seed=None produces fresh randomness each run.
+# Deals are split by dealer upcard across worker processes (`workers`,
+# default one per CPU). Each worker starts from the precomputed tables
+# (see load_tables) when they are on disk. workers=1 stays in process.
+
+WinLossPush = Tuple[float, float, float]
 
-def run_match(agent_a, agent_b, hands: int = 10000, seed: Optional[int] = 1234) -> Dict[str, Any]:
-    if seed is not None:
-        random.seed(seed)
 
-    def stats_for(agent) -> Dict[str, Any]:
-        w = l = pu = 0
-        total = 0
-        for _ in range(hands):
-            payoff = play_one_hand(agent)
-            total += payoff
-            if payoff == 1:
-                w += 1
-            elif payoff == -1:
-                l += 1
-            else:
-                pu += 1
+def _dealer_vs_player(player_total: int, dealer_total: int, dealer_ua: int, deck: Deck) -> WinLossPush:
+    w = l = pu = 0.0
+    for outcome, p in zip(DEALER_OUTCOMES, dealer_final_dist(dealer_total, dealer_ua, deck)):
+        if outcome == "bust" or player_total > outcome:
+            w += p
+        elif player_total < outcome:
+            l += p
+        else:
+            pu += p
+    return w, l, pu
+
+
+def _policy_outcome(
+    agent,
+    p_hand: Hand,
+    d_hand: Hand,
+    upcard: int,
+    deck: Deck,
+    memo: Dict[Tuple[int, int, int], WinLossPush],
+) -> WinLossPush:
+    # Recursion here is bounded by the player's draws in one hand (at
+    # most 10 cards before any total passes 21), well inside Python's
+    # default recursion limit.
+    if p_hand.is_bust:
+        return 0.0, 1.0, 0.0
+
+    key = (_state_key(p_hand.total, p_hand.usable_aces, deck, upcard), d_hand.total, d_hand.usable_aces)
+    res = memo.get(key)
+    if res is not None:
+        return res
+
+    if agent.choose(p_hand, upcard, deck) == "STAND":
+        res = _dealer_vs_player(p_hand.total, d_hand.total, d_hand.usable_aces, deck)
+    else:
+        w = l = pu = 0.0
+        for v, p in iter_draws(deck):
+            sw, sl, spu = _policy_outcome(agent, p_hand.add(v), d_hand, upcard, deck - _DRAW_DELTA[v], memo)
+            w += p * sw
+            l += p * sl
+            pu += p * spu
+        res = (w, l, pu)
+
+    memo[key] = res
+    return res
+
+
+def _exact_outcome_for_upcard(agent, up: int) -> WinLossPush:
+    # Contribution of every deal showing `up` to the weighted (win, loss,
+    # push). A deal's probability does not depend on the order its cards
+    # are drawn in, so the upcard is enumerated first; the policy memo
+    # key includes the upcard, so nothing is lost by keeping one memo per
+    # upcard.
+    memo: Dict[Tuple[int, int, int], WinLossPush] = {}
+    w = l = pu = 0.0
+    empty = Hand.empty()
+    d_up = empty.add(up)
+    q0 = count_of(FULL_DECK, up) / total_cards(FULL_DECK)
+    deck0 = FULL_DECK - _DRAW_DELTA[up]
+
+    for p1, q1 in iter_draws(deck0):
+        deck1 = deck0 - _DRAW_DELTA[p1]
+        for p2, q2 in iter_draws(deck1):
+            deck2 = deck1 - _DRAW_DELTA[p2]
+            p_hand = empty.add(p1).add(p2)
+            for hole, q3 in iter_draws(deck2):
+                deck3 = deck2 - _DRAW_DELTA[hole]
+                q = q0 * q1 * q2 * q3
+                sw, sl, spu = _policy_outcome(agent, p_hand, d_up.add(hole), up, deck3, memo)
+                w += q * sw
+                l += q * sl
+                pu += q * spu
+
+    return w, l, pu
+
+
+def _init_worker() -> None:
+    # Workers started by fork already share the parent's caches, and
+    # reloading the tables into them would copy every page they touch.
+    # Only a worker that starts out empty (spawn/forkserver, or a cold
+    # parent) loads the precomputed tables from disk, if present.
+    if not _EV_CACHE:
+        load_tables()
+
+
+def _exact_outcomes(agents: List[Any], workers: Optional[int]) -> List[WinLossPush]:
+    # All (agent, upcard) pieces go through a single pool, so a match
+    # starts its worker processes once rather than once per agent.
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [(agent, up) for agent in agents for up in CARD_VALUES]
+    if workers <= 1:
+        parts = [_exact_outcome_for_upcard(agent, up) for agent, up in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)), initializer=_init_worker
+        ) as ex:
+            parts = list(ex.map(_exact_outcome_for_upcard, *zip(*tasks)))
+
+    results = []
+    n = len(CARD_VALUES)
+    for i in range(len(agents)):
+        chunk = parts[i * n:(i + 1) * n]
+        results.append((
+            sum(part[0] for part in chunk),
+            sum(part[1] for part in chunk),
+            sum(part[2] for part in chunk),
+        ))
+    return results
+
+
+def exact_outcome(agent, workers: Optional[int] = None) -> WinLossPush:
+    """
+    Exact (P(win), P(loss), P(push)) of one hand played by `agent`.
+
+    The ten dealer upcards are independent pieces of work and are spread
+    over `workers` processes (default: one per CPU). workers=1 runs in
+    this process, reusing any caches it has already filled; prefer it
+    when the caches are already warm or when called from a threaded
+    server. The agent must be picklable to run in worker processes.
+    """
+    return _exact_outcomes([agent], workers)[0]
+
+
+def run_match(
+    agent_a,
+    agent_b,
+    hands: int = 10000,
+    seed: Optional[int] = 1234,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    hands = int(hands)
+    if hands < 1:
+        raise ValueError("hands must be at least 1")
+
+    def stats_for(agent, outcome: WinLossPush) -> Dict[str, Any]:
+        w, l, pu = outcome
+        wins = round(w * hands)
+        losses = round(l * hands)
         return {
             "agent": getattr(agent, "name", agent.__class__.__name__),
             "hands": hands,
-            "wins": w,
-            "losses": l,
-            "pushes": pu,
-            "avg_return": total / hands,
+            "wins": wins,
+            "losses": losses,
+            # Derived so the three counts always add up to `hands`
+            "pushes": hands - wins - losses,
+            "win_rate": w,
+            "loss_rate": l,
+            "push_rate": pu,
+            "avg_return": w - l,
         }
 
-    return {"A": stats_for(agent_a), "B": stats_for(agent_b)}
+    out_a, out_b = _exact_outcomes([agent_a, agent_b], workers)
+    return {"A": stats_for(agent_a, out_a), "B": stats_for(agent_b, out_b)}
 
 
 def _payoff_label(p: int) -> str:
@@ -686,8 +1158,8 @@ if __name__ == "__main__":
     HANDS_PER_EXCHANGE = 7  # increase to reduce ties even more (e.g., 11 or 15)
 
     RUN_BULK_MATCH_RESULTS = False   # turn ON for report
-    BULK_HANDS = 50000
-    BULK_SEED: Optional[int] = None  # set None for random bulk results
+    BULK_HANDS = 50000  # only scales the reported expected win/loss/push counts
+    BULK_SEED: Optional[int] = None  # bulk results are exact, the seed has no effect
     
 
     ev_agent = EVAgent()
@@ -5,7 +5,7 @@ Uses Flask for backend serving and HTML/CSS/JS for frontend
 
 from flask import Flask, render_template, jsonify, request
 import json
-from blackjack_backend import EVAgent, NaiveAgent, play_hand_with_trace, run_match
+from blackjack_backend import EVAgent, NaiveAgent, play_hand_with_trace, run_match, warm_caches
 import os
 
 app = Flask(__name__)
@@ -14,6 +14,15 @@ app = Flask(__name__)
 ev_agent = EVAgent()
 naive_agent = NaiveAgent(hit_below=16)
 
+# Fill the EV caches for every first decision once at startup so hands
+# played through the API are served from cache (loaded from
+# ev_tables.pkl after the first run)
+warm_caches()
+
+# Traced hands are meant for animating in the UI; bulk evaluation goes
+# through /api/match instead
+MAX_TRACED_HANDS = 100
+
 # Session state
 session_data = {
     "current_hand": None,
@@ -35,6 +44,24 @@ def get_agents():
         ]
     })
 
+def _format_hand(payoff, steps, summary):
+    """Format one traced hand for the frontend"""
+    formatted_steps = []
+    for step in steps:
+        formatted_steps.append({
+            "actor": step.actor,
+            "action": step.action,
+            "card": step.card,
+            "player_total": step.player_total,
+            "dealer_total": step.dealer_total,
+            "note": step.note
+        })
+    return {
+        "payoff": payoff,
+        "steps": formatted_steps,
+        "summary": summary
+    }
+
 @app.route('/api/play-hand', methods=['POST'])
 def play_hand():
     """Play a single hand and get the trace"""
@@ -46,25 +73,33 @@ def play_hand():
     
     try:
         payoff, steps, summary = play_hand_with_trace(agent, seed=seed, reveal_hole=True)
-        
-        # Format steps for frontend
-        formatted_steps = []
-        for step in steps:
-            formatted_steps.append({
-                "actor": step.actor,
-                "action": step.action,
-                "card": step.card,
-                "player_total": step.player_total,
-                "dealer_total": step.dealer_total,
-                "note": step.note
-            })
-        
-        return jsonify({
-            "success": True,
-            "payoff": payoff,
-            "steps": formatted_steps,
-            "summary": summary
-        })
+        return jsonify({"success": True, **_format_hand(payoff, steps, summary)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/play-hands', methods=['POST'])
+def play_hands():
+    """Play several hands in one request and get all traces"""
+    data = request.json
+    agent_id = data.get('agent_id', 'EV')
+    count = data.get('count', 1)
+    seed = data.get('seed')
+    
+    agent = ev_agent if agent_id == 'EV' else naive_agent
+    
+    try:
+        count = int(count)
+        if not 1 <= count <= MAX_TRACED_HANDS:
+            raise ValueError(f"count must be between 1 and {MAX_TRACED_HANDS}")
+        hands = []
+        for i in range(count):
+            # Seed only the first hand so a seeded batch is reproducible
+            # without every hand being identical.
+            payoff, steps, summary = play_hand_with_trace(
+                agent, seed=seed if i == 0 else None, reveal_hole=True
+            )
+            hands.append(_format_hand(payoff, steps, summary))
+        return jsonify({"success": True, "hands": hands})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
@@ -76,7 +111,9 @@ def run_match_api():
     seed = data.get('seed')
     
     try:
-        results = run_match(ev_agent, naive_agent, hands=num_hands, seed=seed)
+        # Run in this process: its caches were warmed at startup, and
+        # starting worker processes from the server's threads is unsafe
+        results = run_match(ev_agent, naive_agent, hands=int(num_hands), seed=seed, workers=1)
         return jsonify({
             "success": True,
             "results": results
@@ -106,4 +143,8 @@ def get_card_image():
     return jsonify({"emoji": card_map.get(str(card_val), '?')})
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Serve with waitress instead of the single-threaded Flask debug
+    # server so several UI clients can be handled at once. On Linux,
+    # gunicorn works too: gunicorn -w 4 -k gthread blackjack_frontend:app
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=8)
@@ -285,7 +285,6 @@ function displayTrace(steps) {
 // Run Tournament
 async function runTournament() {
     const numHands = parseInt(document.getElementById('hands-input').value) || 1000;
-    const seed = document.getElementById('tournament-seed-input').value || null;
     const btn = document.getElementById('run-tournament-btn');
     const loading = document.getElementById('tournament-loading');
     const welcome = document.getElementById('tournament-welcome');
@@ -301,8 +300,7 @@ async function runTournament() {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                num_hands: numHands,
-                seed: seed ? parseInt(seed) : null
+                num_hands: numHands
             })
         });
         
@@ -332,7 +330,7 @@ function displayTournamentResults(results) {
     
     ['A', 'B'].forEach(agent => {
         const stats = results[agent];
-        const winRate = (stats.wins / stats.hands * 100).toFixed(1);
+        const winRate = (stats.win_rate * 100).toFixed(1);
         
         html += `
             <div class="result-card">